@@ -1,12 +1,16 @@
 # ... (Imports remain the same as before) ...
-import time
 import os
+import asyncio
+import itertools
+import threading
+import time
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from supabase import create_client, Client
+import plotly.graph_objects as go
+import httpx
+from supabase import create_client, Client, ClientOptions
+from realtime import AsyncRealtimeClient, RealtimePostgresChangesListenEvent, RealtimeSubscribeStates
 from dotenv import load_dotenv
-from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import IsolationForest
 import numpy as np
 
@@ -15,45 +19,330 @@ load_dotenv()
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+
+WINDOW_SIZE = 100  # Rolling window of readings shown and analysed per sensor
+IFOREST_TRAINING_SIZE = 1000  # Readings the Isolation Forest is fit on (Supabase caps responses at 1000 rows)
+ANOMALY_Z_THRESHOLD = 3.5  # Modified z-score cutoff (Iglewicz & Hoaglin)
+STATS_RESYNC_INTERVAL = 100 * WINDOW_SIZE  # Readings between exact recomputes of the trend sums
+SUBSCRIBE_TIMEOUT_SECONDS = 10  # How long to wait for Realtime to confirm a channel join
+REALTIME_RETRY_SECONDS = 60  # Poll for this long after a failed join before trying Realtime again
+
+# One Supabase client per process, shared by every rerun, fragment and session,
+# so its keep-alive pool is reused instead of re-handshaking TLS on each tick.
+@st.cache_resource
+def get_supabase() -> Client:
+    http_client = httpx.Client(http2=True, limits=httpx.Limits(max_keepalive_connections=20))
+    return create_client(url, key, options=ClientOptions(httpx_client=http_client))
 
 # 1. Fetch List of Assets (The Ontology)
 # We cache this so we don't hit the DB every second just for the menu
-@st.cache_data
+@st.cache_data(ttl=300)
 def get_assets():
-    # Join logic: Get assets and their sensors
-    # Note: In a real app we'd do a SQL join. Here we do 2 queries for simplicity.
-    assets = supabase.table("assets").select("*").execute().data
-    sensors = supabase.table("sensors").select("*").execute().data
+    # Join logic: Get assets and their sensors in one round-trip.
+    # PostgREST embeds the related sensors through the sensors.asset_id foreign key.
+    assets = get_supabase().table("assets").select("id,name,sensors(id)").execute().data
     
-    # Map them together
-    asset_map = {}
-    for a in assets:
-        # Find the sensor for this asset
-        related_sensor = next((s for s in sensors if s["asset_id"] == a["id"]), None)
-        if related_sensor:
-            asset_map[a["name"]] = related_sensor["id"]
+    # Map each asset to its (first) sensor
+    asset_map = {a["name"]: a["sensors"][0]["id"] for a in assets if a["sensors"]}
             
     return asset_map
 
 # 2. Modified Data Fetcher
-def get_live_data(sensor_id):
-    response = supabase.table("telemetry") \
-        .select("*") \
-        .eq("sensor_id", sensor_id) \
-        .order("timestamp", desc=True) \
-        .limit(100) \
-        .execute()
+def fetch_recent(sensor_id, n=WINDOW_SIZE):
+    # recent_for_sensor (see supabase/migrations) runs the ORDER BY / LIMIT in
+    # Postgres and returns the window oldest-first, so no client-side sort.
+    response = get_supabase().rpc("recent_for_sensor", {"sid": sensor_id, "n": n}).execute()
     
     df = pd.DataFrame(response.data)
     if not df.empty:
         df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp') 
     return df
 
+# A short TTL coalesces duplicate polls from concurrent sessions into one query.
+# st.cache_data is shared process-wide and hands every caller its own copy,
+# so the panel can add columns to the frame without corrupting the cache.
+@st.cache_data(ttl=1.5, max_entries=64)
+def get_live_data(sensor_id, n=WINDOW_SIZE):
+    return fetch_recent(sensor_id, n)
+
+# 3. Realtime Feed
+# supabase-py only implements Realtime on the async client, so one background
+# event loop owns the websocket for the whole process.
+@st.cache_resource
+def get_realtime():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop, AsyncRealtimeClient(f"{url}/realtime/v1", key)
+
+# Every window change, on any stream, gets a new revision for analyse_window's
+# cache key (it also makes Realtime topics unique). Cached so the counter
+# survives script reruns, like the streams do.
+@st.cache_resource
+def get_revision_counter():
+    return itertools.count()
+
+class TelemetryStream:
+    """Rolling window of the latest readings for one sensor, pushed by Realtime.
+
+    Alongside the window it keeps Welford running moments of (t, value), so the
+    trend line is updated in O(1) per reading - add the new sample, subtract the
+    evicted one - instead of re-summing the whole window on every refresh.
+    """
+
+    def __init__(self, seed_df=None):
+        # Preallocated ring buffers: readings are written in place, never re-boxed
+        self.ts = np.empty(WINDOW_SIZE, dtype="datetime64[ns]")
+        self.val = np.empty(WINDOW_SIZE, dtype=np.float64)
+        self.count = 0  # Total readings seen; count % WINDOW_SIZE is the next slot
+        self.origin = None  # t is measured in seconds from the first reading
+        self.lock = threading.Lock()  # Callbacks append from the realtime thread
+        self.live = False  # True while the Realtime channel is joined
+        self.pending = []  # Readings pushed while a seed is being fetched; None once seeded
+        self.revisions = get_revision_counter()
+        self.revision = next(self.revisions)
+        self._rebuild_stats()
+        if seed_df is not None:
+            self.seed(seed_df)
+
+    def begin_seed(self):
+        """Holds back pushed readings until the next seed() so none fall between the two."""
+        with self.lock:
+            if self.pending is None:
+                self.pending = []
+
+    def seed(self, seed_df):
+        """
+        Replaces the window with seed_df, then replays readings pushed since
+        begin_seed() that are newer than the seed's last one.
+        """
+        seed_df = seed_df.tail(WINDOW_SIZE)
+        seed_ts = seed_val = None
+        if not seed_df.empty:
+            seed_ts = pd.to_datetime(seed_df['timestamp'], utc=True).dt.tz_localize(None).to_numpy()
+            seed_val = seed_df['value'].to_numpy(dtype=np.float64)
+        with self.lock:
+            pending, self.pending = self.pending or [], None
+            self.count = 0
+            if seed_ts is not None:
+                self.count = len(seed_ts)
+                self.ts[:self.count] = seed_ts
+                self.val[:self.count] = seed_val
+                # Keep an existing origin so seconds() stays consistent across re-seeds
+                if self.origin is None:
+                    self.origin = self.ts[0]
+            self._rebuild_stats()
+            for ts, value in pending:
+                if seed_ts is None or ts > seed_ts[-1]:
+                    self._append(ts, value)
+            self.revision = next(self.revisions)
+
+    def seconds(self, ts):
+        """Converts timestamps to seconds since the stream's origin (the regression's t)."""
+        return (ts - self.origin) / np.timedelta64(1, 's')
+
+    def _ordered(self):
+        if self.count < WINDOW_SIZE:
+            return self.ts[:self.count].copy(), self.val[:self.count].copy()
+        head = self.count % WINDOW_SIZE
+        return np.roll(self.ts, -head), np.roll(self.val, -head)
+
+    def _rebuild_stats(self):
+        # Exact recomputation from the buffers; also bounds the rounding error
+        # that add/remove updates accumulate over a long-running stream.
+        ts, y = self._ordered()
+        self.n = len(y)
+        if self.n == 0:
+            self.mean_t = self.mean_y = self.m2_t = self.c_ty = 0.0
+            return
+        t = self.seconds(ts)
+        self.mean_t = t.mean()
+        self.mean_y = y.mean()
+        self.m2_t = ((t - self.mean_t) ** 2).sum()
+        self.c_ty = ((t - self.mean_t) * (y - self.mean_y)).sum()
+
+    def _add_stats(self, t, y):
+        self.n += 1
+        dt = t - self.mean_t
+        self.mean_t += dt / self.n
+        self.mean_y += (y - self.mean_y) / self.n
+        self.m2_t += dt * (t - self.mean_t)
+        self.c_ty += dt * (y - self.mean_y)
+
+    def _remove_stats(self, t, y):
+        # Exact inverse of _add_stats
+        self.n -= 1
+        if self.n == 0:
+            self.mean_t = self.mean_y = self.m2_t = self.c_ty = 0.0
+            return
+        mean_t_prev, mean_y_prev = self.mean_t, self.mean_y
+        self.mean_t -= (t - self.mean_t) / self.n
+        self.mean_y -= (y - self.mean_y) / self.n
+        self.m2_t -= (t - self.mean_t) * (t - mean_t_prev)
+        self.c_ty -= (t - self.mean_t) * (y - mean_y_prev)
+
+    def _append(self, ts, value):
+        if self.origin is None:
+            self.origin = ts
+        slot = self.count % WINDOW_SIZE
+        if self.count >= WINDOW_SIZE:
+            self._remove_stats(self.seconds(self.ts[slot]), self.val[slot])
+        self.ts[slot] = ts
+        self.val[slot] = value
+        self._add_stats(self.seconds(ts), value)
+        self.count += 1
+        if self.count % STATS_RESYNC_INTERVAL == 0:
+            self._rebuild_stats()
+        self.revision = next(self.revisions)
+
+    def append(self, ts, value):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((ts, value))
+            else:
+                self._append(ts, value)
+
+    def on_insert(self, payload):
+        record = payload["data"]["record"]
+        ts = pd.to_datetime(record["timestamp"], utc=True).tz_localize(None).to_datetime64()
+        self.append(ts, float(record["value"]))
+
+    def snapshot(self):
+        """
+        Returns the window oldest-first as (timestamps, values) arrays, plus the
+        least-squares (slope, intercept) of value over seconds() for that window.
+        """
+        with self.lock:
+            ts, y = self._ordered()
+            slope = self.c_ty / self.m2_t if self.m2_t > 0 else 0.0
+            intercept = self.mean_y - slope * self.mean_t
+            return ts, y, slope, intercept
+
+# Shared by every session watching the sensor: one subscription, seeded once,
+# replaces polling the telemetry table on each refresh.
+@st.cache_resource
+def get_telemetry_stream(sensor_id):
+    stream = TelemetryStream()  # Empty and holding pushes until seeded
+    loop, client = get_realtime()
+    joined = threading.Event()
+    # A unique topic per stream: the client keys channels by topic, so a late
+    # close of a replaced channel must not be able to remove its successor
+    channel = client.channel(f"tel:{sensor_id}:{next(get_revision_counter())}")
+
+    def reseed():
+        # Uncached on purpose: get_live_data may be up to its TTL stale
+        stream.seed(fetch_recent(sensor_id))
+
+    def on_status(state, err):
+        # Runs on the realtime loop thread
+        if state == RealtimeSubscribeStates.SUBSCRIBED:
+            if stream.live:
+                # Rejoined after a reconnect: readings inserted while the socket
+                # was down were never pushed, so refetch the window
+                stream.begin_seed()
+                loop.run_in_executor(None, reseed)
+            stream.live = True
+        elif client.channels.get(channel.topic) is channel:
+            # CHANNEL_ERROR / TIMED_OUT / CLOSED: this stream will never hear
+            # another insert, so drop it and let the next refresh resubscribe.
+            # Skipped once the channel is removed, when the cached stream may
+            # already be its replacement.
+            print(f"⚠️ Realtime channel for {sensor_id} {state}: {err}")
+            stream.live = False
+            get_telemetry_stream.clear(sensor_id)
+            asyncio.run_coroutine_threadsafe(client.remove_channel(channel), loop)
+        joined.set()
+
+    channel.on_postgres_changes(
+        event=RealtimePostgresChangesListenEvent.Insert,
+        schema="public",
+        table="telemetry",
+        filter=f"sensor_id=eq.{sensor_id}",
+        callback=stream.on_insert,
+    )
+    # Subscribe first and seed once the join is confirmed, so inserts made
+    # while the seed query runs are pushed (and merged) rather than lost
+    subscribing = asyncio.run_coroutine_threadsafe(channel.subscribe(on_status), loop)
+    try:
+        # Also bounds realtime-py's own connect retries when the server is unreachable
+        subscribing.result(timeout=SUBSCRIBE_TIMEOUT_SECONDS)
+        joined.wait(SUBSCRIBE_TIMEOUT_SECONDS)
+    finally:
+        if not stream.live:
+            subscribing.cancel()
+            asyncio.run_coroutine_threadsafe(client.remove_channel(channel), loop)
+    if not stream.live:
+        raise ConnectionError(f"Realtime join for sensor {sensor_id} failed")
+    reseed()
+    return stream
+
+# Polling fallback while Realtime is unavailable, on the same cadence as get_live_data
+@st.cache_resource(ttl=1.5, max_entries=64)
+def get_polled_stream(sensor_id):
+    return TelemetryStream(get_live_data(sensor_id))
+
+# Failed joins aren't cached by st.cache_resource, so remember them here:
+# sensor_id -> time.monotonic() before which Realtime isn't retried
+@st.cache_resource
+def get_realtime_down_until():
+    return {}
+
+def get_stream(sensor_id):
+    """The sensor's live Realtime stream, or a polled window if it can't be joined."""
+    down_until = get_realtime_down_until()
+    if time.monotonic() < down_until.get(sensor_id, 0):
+        return get_polled_stream(sensor_id)
+    try:
+        stream = get_telemetry_stream(sensor_id)
+        if stream.live:
+            return stream
+    except Exception as e:
+        # Without the back-off every 2s tick would block on another join attempt
+        print(f"⚠️ Realtime unavailable for {sensor_id}, polling for {REALTIME_RETRY_SECONDS}s: {e!r}")
+        down_until[sensor_id] = time.monotonic() + REALTIME_RETRY_SECONDS
+    return get_polled_stream(sensor_id)
+
+# 4. Prefit Isolation Forest
+# Fitting builds 100 trees - do it once per sensor every 5 minutes on a larger
+# window and only call .predict() per tick, which is cheap.
+@st.cache_resource(ttl=300)
+def get_iforest(sensor_id):
+    df = get_live_data(sensor_id, n=IFOREST_TRAINING_SIZE)
+    # Contamination=0.05 means "we expect ~5% of data to be weird"
+    iso_forest = IsolationForest(n_estimators=100, contamination=0.05, random_state=42)
+    return iso_forest.fit(df[['value']].values)
+
+# 5. Shared Window Analysis
+# Every session watching a sensor would otherwise score the same window on each
+# tick. Keyed by the stream's revision (bumped on every window change), the work
+# is done once per new reading and the result is shared by all sessions.
+# The leading underscore keeps the stream itself out of the cache key.
+@st.cache_resource(ttl=120, max_entries=64)
+def analyse_window(_stream, sensor_id, anomaly_model, revision):
+    ts, y, slope, intercept = _stream.snapshot()
+    anomaly = None
+    
+    if len(y) > 10:
+        # We look for data points that don't fit the "physics" of the last 100 points.
+        if anomaly_model == "Isolation Forest":
+            # Score against the cached, prefit forest - no refit per tick
+            anomaly = get_iforest(sensor_id).predict(y.reshape(-1, 1))
+        else:
+            # Robust z-score: Median/MAD is a single O(N) pass with no model to fit
+            med = np.median(y)
+            mad = np.median(np.abs(y - med)) + 1e-9
+            scores = 0.6745 * (y - med) / mad
+            anomaly = np.where(np.abs(scores) > ANOMALY_Z_THRESHOLD, -1, 1)
+        # Returns -1 for anomaly, 1 for normal
+        anomaly.flags.writeable = False
+    
+    # Shared between sessions, so make sure nobody edits them in place
+    ts.flags.writeable = False
+    y.flags.writeable = False
+    return ts, y, slope, intercept, anomaly
+
 # Fetch maintenance history for the specific sensor
 def get_maintenance_history(sensor_id):
-    response = supabase.table("maintenance_tickets") \
+    response = get_supabase().table("maintenance_tickets") \
         .select("*") \
         .eq("sensor_id", sensor_id) \
         .order("created_at", desc=True) \
@@ -69,125 +358,153 @@ asset_map = get_assets()
 selected_asset_name = st.sidebar.selectbox("Select Asset to Monitor", list(asset_map.keys()))
 selected_sensor_id = asset_map[selected_asset_name]
 
+ANOMALY_MODELS = ["Robust Z-Score", "Isolation Forest"]
+anomaly_model = st.sidebar.radio("Anomaly Model", ANOMALY_MODELS)
+advanced_view = st.sidebar.toggle("Advanced view (Plotly)")
+
 st.sidebar.markdown("---")
 st.sidebar.info(f"**Monitoring ID:**\n{selected_sensor_id}")
 st.sidebar.markdown("Status: **ONLINE** 🟢")
 
 # MAIN DASHBOARD (Same logic, but filtered by selected_sensor_id)
-dashboard_placeholder = st.empty()
 CRITICAL_THRESHOLD = 115.0 
 
-while True:
-    df = get_live_data(selected_sensor_id)
+def build_telemetry_figure():
+    """Creates the chart skeleton once; each tick only swaps the trace data."""
+    fig = go.Figure([
+        go.Scatter(mode='lines+markers', name='Vibration', showlegend=False),
+        go.Scatter(mode='lines', line=dict(color='orange', dash='dot'), name='Trend Projection'),
+        go.Scatter(mode='markers', marker=dict(color='red', size=10, symbol='x'), name='Detected Anomaly'),
+    ])
+    fig.update_layout(xaxis_title='timestamp', yaxis_title='value')
+    
+    # Add Threshold
+    fig.add_hline(y=CRITICAL_THRESHOLD, line_dash="dash", line_color="red")
+    return fig
+
+# Fragments rerun on their own timer, so only the panel body re-executes
+# each tick and the sidebar stays responsive between refreshes.
+@st.fragment(run_every="2s")
+def telemetry_panel(selected_sensor_id, selected_asset_name, anomaly_model, advanced_view):
+    # Work on plain NumPy arrays straight from the stream's buffers
+    stream = get_stream(selected_sensor_id)
+    ts, y, slope, intercept, anomaly = analyse_window(stream, selected_sensor_id, anomaly_model, stream.revision)
     
-    with dashboard_placeholder.container():
-        st.subheader(f"Live Telemetry: {selected_asset_name}")
+    st.subheader(f"Live Telemetry: {selected_asset_name}")
+    
+    if len(y) > 10:
+        current_value = y[-1]
         
-        if not df.empty and len(df) > 10:
-            latest_reading = df.iloc[-1]
-            current_value = latest_reading['value']
-            
-            # --- ADVANCED ML LAYER (Regression + Anomaly Detection) ---
-            
-            # 1. Feature Engineering
-            df['seconds_relative'] = (df['timestamp'] - df['timestamp'].min()).dt.total_seconds()
-            X = df[['seconds_relative']] # Time feature
-            y = df['value']
-            
-            # 2. Linear Regression (Trend / RUL)
-            model_reg = LinearRegression()
-            model_reg.fit(X, y)
-            slope = model_reg.coef_[0]
-            intercept = model_reg.intercept_
-            
-            # 3. Isolation Forest (Anomaly Detection)
-            # We look for data points that don't fit the "physics" of the last 100 points
-            # Reshape data for Isolation Forest (needs 2D array)
-            X_iso = df[['value']].values 
-            
-            # Contamination=0.05 means "we expect ~5% of data to be weird"
-            iso_forest = IsolationForest(contamination=0.05, random_state=42)
-            df['anomaly'] = iso_forest.fit_predict(X_iso) 
-            # Returns -1 for anomaly, 1 for normal
-            
-            # Check if the LATEST point is an anomaly
-            latest_is_anomaly = df['anomaly'].iloc[-1] == -1
+        # --- ADVANCED ML LAYER (Regression + Anomaly Detection) ---
+        # Computed once per new reading in analyse_window() and shared by all sessions
+        
+        # 1. Feature Engineering
+        t = stream.seconds(ts) # Time feature
+        
+        # 2. Linear Regression (Trend / RUL)
+        # slope/intercept come from the stream's running Welford sums, which are
+        # updated per reading - nothing is re-fit here.
+        
+        # 3. Anomaly Detection (see analyse_window)
+        
+        # Check if the LATEST point is an anomaly
+        latest_is_anomaly = anomaly[-1] == -1
 
-            # --- DECISION LOGIC ---
-            rul_message = "Stable"
-            status_color = "normal" # Streamlit green
-            
-            # Priority 1: Is it an Anomaly? (Immediate Physics Break)
-            if latest_is_anomaly:
-                rul_message = "ANOMALY DETECTED (Unusual Pattern)"
-                status_color = "off" # Streamlit red
+        # --- DECISION LOGIC ---
+        rul_message = "Stable"
+        status_color = "normal" # Streamlit green
+        
+        # Priority 1: Is it an Anomaly? (Immediate Physics Break)
+        if latest_is_anomaly:
+            rul_message = "ANOMALY DETECTED (Unusual Pattern)"
+            status_color = "off" # Streamlit red
+        
+        # Priority 2: Is it Drifting? (Long-term Wear)
+        elif slope > 0.001:
+            time_to_critical = (CRITICAL_THRESHOLD - intercept) / slope
+            current_time_rel = t[-1]
+            seconds_remaining = time_to_critical - current_time_rel
             
-            # Priority 2: Is it Drifting? (Long-term Wear)
-            elif slope > 0.001:
-                time_to_critical = (CRITICAL_THRESHOLD - intercept) / slope
-                current_time_rel = df['seconds_relative'].iloc[-1]
-                seconds_remaining = time_to_critical - current_time_rel
-                
-                if seconds_remaining > 0:
-                    rul_message = f"RUL: {seconds_remaining/60:.1f} Mins"
-                    if seconds_remaining < 60: status_color = "off"
-                else:
-                    rul_message = "CRITICAL FAILURE"
-                    status_color = "off"
-
-            # --- VISUALIZATION ---
-            col1, col2, col3 = st.columns(3)
-            with col1: st.metric("Vibration", f"{current_value:.2f} Hz", f"{slope:.4f}")
-            with col2: st.metric("AI Status Analysis", rul_message, delta_color=status_color)
-            with col3: st.metric("Buffer Size", len(df))
+            if seconds_remaining > 0:
+                rul_message = f"RUL: {seconds_remaining/60:.1f} Mins"
+                if seconds_remaining < 60: status_color = "off"
+            else:
+                rul_message = "CRITICAL FAILURE"
+                status_color = "off"
+
+        # --- VISUALIZATION ---
+        col1, col2, col3 = st.columns(3)
+        with col1: st.metric("Vibration", f"{current_value:.2f} Hz", f"{slope:.4f}")
+        with col2: st.metric("AI Status Analysis", rul_message, delta_color=status_color)
+        with col3: st.metric("Buffer Size", len(y))
 
+        trend_line = intercept + slope * t
+        is_anomaly = anomaly == -1
+        
+        if advanced_view:
             # Advanced Charting
-            fig = px.line(df, x='timestamp', y='value', markers=True, title=f"Live Telemetry: {selected_asset_name}")
-            
-            # Add Threshold
-            fig.add_hline(y=CRITICAL_THRESHOLD, line_dash="dash", line_color="red")
+            # The figure lives in session state, so rather than rebuilding it with
+            # px.line + add_scatter every tick we only replace the trace data.
+            if "telemetry_fig" not in st.session_state:
+                st.session_state.telemetry_fig = build_telemetry_figure()
+            fig = st.session_state.telemetry_fig
+            fig.layout.title.text = f"Live Telemetry: {selected_asset_name}"
+            fig.data[0].update(x=ts, y=y)
             
-            # Add Trend Line
-            df['trend_line'] = model_reg.predict(X)
-            fig.add_scatter(x=df['timestamp'], y=df['trend_line'], mode='lines', 
-                           line=dict(color='orange', dash='dot'), name='Trend Projection')
+            # Trend Line
+            fig.data[1].update(x=ts, y=trend_line)
             
-            # Add ANOMALY MARKERS (The Red Dots)
-            anomalies = df[df['anomaly'] == -1]
-            if not anomalies.empty:
-                fig.add_scatter(x=anomalies['timestamp'], y=anomalies['value'], 
-                               mode='markers', marker=dict(color='red', size=10, symbol='x'), 
-                               name='Detected Anomaly')
-
-            # Static key - the container handles clearing, no need for dynamic keys
+            # ANOMALY MARKERS (The Red Dots)
+            fig.data[2].update(x=ts[is_anomaly], y=y[is_anomaly], showlegend=bool(is_anomaly.any()))
+
+            # Static key - the fragment replaces its own output, no need for dynamic keys
             st.plotly_chart(fig, use_container_width=True, key="main_telemetry_chart")
+        else:
+            # Native Vega-Lite charts: a much smaller spec to ship every 2s than Plotly's
+            df_plot = pd.DataFrame(
+                {'value': y, 'trend': trend_line, 'threshold': CRITICAL_THRESHOLD},
+                index=pd.Index(ts, name='timestamp'),
+            )
+            st.line_chart(df_plot, y=['value', 'trend', 'threshold'], color=['#1f77b4', '#ffa500', '#ff0000'])
             
-            # --- CONTEXT LAYER: SYNTHESIS ---
-            # Show the "Human Side" of the data
-            st.markdown("### 📋 Operational Context (Recent Maintenance)")
-            
-            history_df = get_maintenance_history(selected_sensor_id)
-            
-            if not history_df.empty:
-                # Clean up the timestamp for display
-                history_df['created_at'] = pd.to_datetime(history_df['created_at'])
-                
-                # Show as a clean interactive table
-                st.dataframe(
-                    history_df[['created_at', 'status', 'id']],
-                    column_config={
-                        "created_at": st.column_config.DatetimeColumn("Dispatch Time", format="D MMM, HH:mm"),
-                        "status": st.column_config.TextColumn("Ticket Status"),
-                        "id": st.column_config.NumberColumn("Ticket #")
-                    },
-                    use_container_width=True,
-                    hide_index=True,
-                    key="maintenance_history_table"
+            # ANOMALY MARKERS (Streamlit's native charts can't be layered, so they get their own)
+            if is_anomaly.any():
+                st.caption("Detected Anomalies")
+                st.scatter_chart(
+                    pd.DataFrame({'timestamp': ts[is_anomaly], 'value': y[is_anomaly]}),
+                    x='timestamp', y='value', color='#ff0000', height=200,
                 )
-            else:
-                st.info("No recent maintenance history found for this asset.")
+        
+    else:
+        st.warning("Initializing data stream...")
 
-        else:
-            st.warning("Initializing data stream...")
-            
-    time.sleep(2)  # Refresh every 2 seconds for stability
\ No newline at end of file
+# Tickets change far less often than telemetry, so they refresh on a slower timer
+@st.fragment(run_every="30s")
+def maintenance_panel(selected_sensor_id):
+    # --- CONTEXT LAYER: SYNTHESIS ---
+    # Show the "Human Side" of the data
+    st.markdown("### 📋 Operational Context (Recent Maintenance)")
+    
+    history_df = get_maintenance_history(selected_sensor_id)
+    
+    if not history_df.empty:
+        # Clean up the timestamp for display
+        history_df['created_at'] = pd.to_datetime(history_df['created_at'])
+        
+        # Show as a clean interactive table
+        st.dataframe(
+            history_df[['created_at', 'status', 'id']],
+            column_config={
+                "created_at": st.column_config.DatetimeColumn("Dispatch Time", format="D MMM, HH:mm"),
+                "status": st.column_config.TextColumn("Ticket Status"),
+                "id": st.column_config.NumberColumn("Ticket #")
+            },
+            use_container_width=True,
+            hide_index=True,
+            key="maintenance_history_table"
+        )
+    else:
+        st.info("No recent maintenance history found for this asset.")
+
+telemetry_panel(selected_sensor_id, selected_asset_name, anomaly_model, advanced_view)
+maintenance_panel(selected_sensor_id)
@@ -4,15 +4,18 @@ Handles sensor telemetry ingestion and stores data in Supabase.
 """
 
 import os
-from datetime import datetime
-from typing import Optional  # Still used in IngestResponse
-from contextlib import asynccontextmanager
+import uuid
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional
+from contextlib import asynccontextmanager, suppress
 
+import asyncpg
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import acreate_client
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,23 +23,38 @@ load_dotenv()
 # Environment variable validation
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Writes go straight to Postgres through Supavisor's transaction-mode pooler
+# (postgresql://...pooler.supabase.com:6543/postgres); DATABASE_URL is the
+# fallback for a direct connection string.
+DATABASE_URL = os.getenv("SUPABASE_POOLER_URL") or os.getenv("DATABASE_URL")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+if not SUPABASE_URL or not SUPABASE_KEY or not DATABASE_URL:
     raise RuntimeError(
-        "Missing required environment variables: SUPABASE_URL and/or SUPABASE_KEY. "
+        "Missing required environment variables: SUPABASE_URL, SUPABASE_KEY and/or "
+        "SUPABASE_POOLER_URL (or DATABASE_URL). "
         "Please create a .env file with these values."
     )
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
+# Write-behind buffer: readings are flushed to Postgres with COPY this often
+FLUSH_INTERVAL_SECONDS = 0.1
+TELEMETRY_COLUMNS = ("sensor_id", "value", "timestamp")
+# Upper bound on readings held in memory while the database is unreachable;
+# ingestion answers 503 instead of 202 once it is reached
+MAX_BUFFERED_READINGS = 100_000
+INSERT_TELEMETRY_SQL = 'INSERT INTO telemetry (sensor_id, value, "timestamp") VALUES ($1, $2, $3)'
+# Only these mean the database is unreachable and a batch is worth retrying;
+# anything else would fail the same way on every retry
+CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.InterfaceError, asyncpg.PostgresConnectionError)
+# Bad rows: asyncpg encodes on the client and raises TypeError/ValueError for a
+# value the column type can't take; the server rejects the rest
+ROW_ERRORS = (TypeError, ValueError, asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
 
 # =============================================================================
 # Pydantic Models
 # =============================================================================
 
 class TelemetryReading(BaseModel):
-    sensor_id: str
+    sensor_id: uuid.UUID  # Malformed ids are rejected with a 422
     value: float
     timestamp: datetime | None = None  # Optional, defaults to now
 
@@ -49,25 +67,131 @@ class IngestResponse(BaseModel):
     timestamp: datetime
 
 
+class BatchIngestResponse(BaseModel):
+    """Response model for successful batch ingestion."""
+    success: bool
+    message: str
+    queued: int
+    timestamp: datetime
+
+
+class RootResponse(BaseModel):
+    """Response model for the API information endpoint."""
+    name: str
+    version: str
+    docs: str
+    health: str
+
+
 class HealthResponse(BaseModel):
     """Response model for health check endpoint."""
     status: str
     timestamp: datetime
     supabase_connected: bool
+    database_connected: bool
 
 
 # =============================================================================
 # Application Lifespan
 # =============================================================================
 
+def requeue(app: FastAPI, records: list):
+    """Puts unflushed readings back at the front of the buffer, oldest dropped first if it is full."""
+    buffer = records + app.state.buffer
+    overflow = len(buffer) - MAX_BUFFERED_READINGS
+    if overflow > 0:
+        print(f"⚠️ Buffer full, dropping {overflow} oldest telemetry readings")
+        buffer = buffer[overflow:]
+    app.state.buffer = buffer
+
+
+async def insert_rows(conn, records: list):
+    """Inserts readings one by one so a single bad row only loses itself."""
+    rejected = 0
+    async with conn.transaction():
+        for record in records:
+            try:
+                # Nested transaction = savepoint, rolled back on its own
+                async with conn.transaction():
+                    await conn.execute(INSERT_TELEMETRY_SQL, *record)
+            except (TypeError, ValueError) as e:
+                # Checked first: asyncpg's client-side DataError is also an InterfaceError
+                rejected += 1
+                print(f"⚠️ Rejected telemetry reading {record}: {e}")
+            except CONNECTION_ERRORS:
+                raise
+            except asyncpg.PostgresError as e:
+                rejected += 1
+                print(f"⚠️ Rejected telemetry reading {record}: {e}")
+    if rejected:
+        print(f"⚠️ Flushed {len(records) - rejected} telemetry readings, rejected {rejected}")
+
+
+async def flush_buffer(app: FastAPI):
+    """Writes every buffered reading to the telemetry table in one COPY."""
+    if not app.state.buffer:
+        return
+    
+    # Swap the buffer out before awaiting so new readings land in a fresh list
+    records, app.state.buffer = app.state.buffer, []
+    try:
+        async with app.state.pool.acquire() as conn:
+            try:
+                # One transaction keeps the column introspection and the COPY on
+                # the same server connection behind the transaction-mode pooler
+                async with conn.transaction():
+                    await conn.copy_records_to_table("telemetry", records=records, columns=TELEMETRY_COLUMNS)
+            except ROW_ERRORS:
+                # COPY is all-or-nothing: e.g. one unknown sensor_id fails the
+                # whole batch, so fall back to per-row inserts to isolate it
+                await insert_rows(conn, records)
+    except asyncio.CancelledError:
+        # Shutdown cancelled an in-flight batch: keep it for the final flush
+        requeue(app, records)
+        raise
+    except CONNECTION_ERRORS as e:
+        # Database unreachable: these were already acknowledged, so retry next tick
+        print(f"⚠️ Failed to flush {len(records)} telemetry readings, requeued: {e}")
+        requeue(app, records)
+    except Exception as e:
+        # Retrying can't fix e.g. a missing table or privilege, and would block
+        # every later reading behind this batch
+        print(f"⚠️ Failed to flush {len(records)} telemetry readings, dropped: {e}")
+
+
+async def flush_loop(app: FastAPI):
+    """Background task draining the write-behind buffer every FLUSH_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        await flush_buffer(app)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler for startup/shutdown events."""
     # Startup
     print("🚀 IoT Predictive Platform starting up...")
+    # The REST client is kept for reads/health checks only
+    # (async, so it doesn't block the event loop)
+    app.state.sb = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
     print(f"📡 Connected to Supabase: {SUPABASE_URL[:30]}...")
+    
+    # Writes bypass PostgREST: buffered in memory and bulk-copied over asyncpg.
+    # Transaction pooling can't keep named prepared statements across
+    # transactions, so asyncpg's statement cache must be disabled.
+    app.state.pool = await asyncpg.create_pool(
+        DATABASE_URL, min_size=2, max_size=10, statement_cache_size=0
+    )
+    app.state.buffer = []
+    flusher = asyncio.create_task(flush_loop(app))
     yield
     # Shutdown
+    flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await flusher
+    # Don't lose readings accepted (or requeued by a cancelled flush) since the last tick
+    await flush_buffer(app)
+    await app.state.pool.close()
     print("👋 IoT Predictive Platform shutting down...")
 
 
@@ -98,87 +222,123 @@ app.add_middleware(
 # Endpoints
 # =============================================================================
 
-@app.get("/", tags=["Root"])
+def to_record(reading: TelemetryReading) -> tuple:
+    """Prepare a reading for the telemetry table, in TELEMETRY_COLUMNS order."""
+    timestamp = reading.timestamp or datetime.now(timezone.utc)
+    if timestamp.tzinfo is None:
+        # Naive timestamps are UTC, matching how Postgres stored them before
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return (reading.sensor_id, reading.value, timestamp)
+
+
+def reject_if_buffer_full():
+    """Refuse new readings rather than acknowledge ones that can't be kept."""
+    if len(app.state.buffer) >= MAX_BUFFERED_READINGS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Telemetry buffer is full, retry later"
+        )
+
+
+@app.get("/", response_model=RootResponse, tags=["Root"])
 async def root():
     """Root endpoint with API information."""
-    return {
-        "name": "IoT Predictive Platform API",
-        "version": "1.0.0",
-        "docs": "/docs",
-        "health": "/health"
-    }
+    return RootResponse(
+        name="IoT Predictive Platform API",
+        version="1.0.0",
+        docs="/docs",
+        health="/health"
+    )
 
 
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
     """
-    Health check endpoint to verify API and Supabase connectivity.
+    Health check endpoint to verify API, Supabase and database connectivity.
     """
     supabase_ok = False
     try:
-        # Test Supabase connection with a simple query
-        supabase.table("telemetry").select("*").limit(1).execute()
+        # Test Supabase connection with the cheapest possible query
+        # (HEAD request: PostgREST runs it but sends no rows back)
+        await app.state.sb.table("telemetry").select("id", head=True).limit(1).execute()
         supabase_ok = True
     except Exception:
         supabase_ok = False
 
+    database_ok = False
+    try:
+        # Writes go through the asyncpg pool, not PostgREST, so probe it too
+        async with app.state.pool.acquire() as conn:
+            await conn.fetchval("SELECT 1")
+        database_ok = True
+    except Exception:
+        database_ok = False
+
     return HealthResponse(
-        status="healthy" if supabase_ok else "degraded",
+        status="healthy" if supabase_ok and database_ok else "degraded",
         timestamp=datetime.utcnow(),
-        supabase_connected=supabase_ok
+        supabase_connected=supabase_ok,
+        database_connected=database_ok
     )
 
 
 @app.post(
     "/ingest",
     response_model=IngestResponse,
-    status_code=status.HTTP_201_CREATED,
+    status_code=status.HTTP_202_ACCEPTED,
     tags=["Telemetry"],
     summary="Ingest sensor reading",
-    description="Receives a sensor reading and inserts it into the telemetry table in Supabase."
+    description="Receives a sensor reading and queues it for bulk insertion into the telemetry table."
 )
 async def ingest_sensor_reading(reading: TelemetryReading):
     """
     Ingest a sensor reading into the telemetry table.
     
-    - **sensor_id**: Unique identifier for the sensor
+    - **sensor_id**: UUID of the sensor
     - **value**: The sensor reading value
     - **timestamp**: Optional timestamp (defaults to server time)
+    
+    The reading is buffered and written within FLUSH_INTERVAL_SECONDS,
+    so no record_id is returned.
     """
-    try:
-        # Prepare the data for insertion
-        record = {
-            "sensor_id": reading.sensor_id,
-            "value": reading.value,
-            "timestamp": (reading.timestamp or datetime.utcnow()).isoformat(),
-        }
-        
-        # Insert into Supabase telemetry table
-        result = supabase.table("telemetry").insert(record).execute()
-        
-        # Check if insertion was successful
-        if result.data and len(result.data) > 0:
-            inserted_record = result.data[0]
-            return IngestResponse(
-                success=True,
-                message="Sensor reading successfully ingested",
-                record_id=str(inserted_record.get("id", "")),
-                timestamp=datetime.utcnow()
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to insert record: No data returned from Supabase"
-            )
-            
-    except HTTPException:
-        raise
-    except Exception as e:
+    reject_if_buffer_full()
+    app.state.buffer.append(to_record(reading))
+    return IngestResponse(
+        success=True,
+        message="Sensor reading queued for ingestion",
+        timestamp=datetime.utcnow()
+    )
+
+
+@app.post(
+    "/ingest_batch",
+    response_model=BatchIngestResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["Telemetry"],
+    summary="Ingest a batch of sensor readings",
+    description="Receives many sensor readings and queues them for bulk insertion into the telemetry table."
+)
+async def ingest_sensor_batch(readings: List[TelemetryReading]):
+    """
+    Ingest a batch of sensor readings into the telemetry table.
+    
+    Readings join the same write-behind buffer as /ingest.
+    """
+    if not readings:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to ingest sensor reading: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch must contain at least one reading"
         )
 
+    reject_if_buffer_full()
+    app.state.buffer.extend(to_record(r) for r in readings)
+    return BatchIngestResponse(
+        success=True,
+        message="Sensor readings queued for ingestion",
+        queued=len(readings),
+        timestamp=datetime.utcnow()
+    )
+
 
 # =============================================================================
 # Run with Uvicorn (for development)
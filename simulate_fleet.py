@@ -1,8 +1,8 @@
-import time
-import math
-import random
-import requests
-import threading
+import asyncio
+import numpy as np
+from numba import njit, prange
+import httpx
+import orjson
 import os
 from datetime import datetime
 
@@ -20,70 +20,176 @@ SENSOR_CONFIG = [
 ]
 
 # Defaults to localhost if not set, but allows Docker to override it
-API_URL = os.getenv("API_URL", "http://localhost:8000/ingest")
+API_URL = os.getenv("API_URL", "http://localhost:8000/ingest_batch")
+FLUSH_INTERVAL = 5  # Seconds of readings bundled into each POST
+CHUNK_SIZE = 1000   # Ticks synthesised per compiled call
+# Seconds of 1Hz history to replay into the API before the live simulation starts
+BACKFILL_SECONDS = int(os.getenv("BACKFILL_SECONDS", "0"))
+BACKFILL_BATCH_SIZE = 5000  # Readings per POST while backfilling
+JSON_HEADERS = {"content-type": "application/json"}
 
-def simulate_sensor(sensor):
+# Behavior Logic, compiled with Numba: one scalar loop per behavior
+@njit(cache=True)
+def gen_failing(t0, n):
+    # Linear drift upwards (The one that will explode)
+    out = np.empty(n)
+    for i in range(n):
+        tick = t0 + i
+        drift = tick * 0.08
+        out[i] = 100 + (10 * np.sin(tick * 0.1)) + np.random.uniform(-2, 2) + drift
+    return out
+
+@njit(cache=True)
+def gen_stable(t0, n):
+    # Just vibration, no drift
+    out = np.empty(n)
+    for i in range(n):
+        tick = t0 + i
+        out[i] = 100 + (5 * np.sin(tick * 0.2)) + np.random.uniform(-2, 2)
+    return out
+
+@njit(cache=True)
+def gen_erratic(t0, n):
+    # Random spikes every now and then
+    out = np.empty(n)
+    for i in range(n):
+        spike = 20.0 if np.random.random() > 0.95 else 0.0
+        out[i] = 100 + np.random.uniform(-2, 2) + spike
+    return out
+
+BEHAVIOR_CODES = {"failing": 0, "stable": 1, "erratic": 2}
+
+@njit(cache=True)
+def gen_behavior(code, t0, n):
+    if code == 0:
+        return gen_failing(t0, n)
+    elif code == 1:
+        return gen_stable(t0, n)
+    elif code == 2:
+        return gen_erratic(t0, n)
+    return np.zeros(n)
+
+@njit(parallel=True, cache=True)
+def replay_fleet(codes, n):
     """
-    Runs a simulation loop for a SINGLE sensor.
+    Synthesises n ticks for every sensor at once, one sensor per thread.
     """
-    tick = 0
+    out = np.empty((len(codes), n))
+    for s in prange(len(codes)):
+        out[s] = gen_behavior(codes[s], 0, n)
+    return out
+
+def generate_chunk(behavior, t0, n=CHUNK_SIZE):
+    """
+    Synthesises n consecutive ticks for one behavior in a single compiled call.
+    """
+    return gen_behavior(BEHAVIOR_CODES.get(behavior, -1), t0, n)
+
+async def simulate_sensor(sensor, readings, start_tick=0):
+    """
+    Runs a simulation loop for a SINGLE sensor as an asyncio task.
+    Readings are only buffered here; flush_readings() ships them.
+    start_tick continues the signal where a backfill left off.
+    """
+    tick = start_tick
     sensor_id = sensor["id"]
     behavior = sensor["behavior"]
     print(f"Starting simulation for {sensor['name']} ({behavior})")
     
     while True:
-        base_vibration = 100
-        noise = random.uniform(-2, 2)
-        value = 0
-        
-        # Behavior Logic
-        if behavior == "failing":
-            # Linear drift upwards (The one that will explode)
-            drift = tick * 0.08
-            value = base_vibration + (10 * math.sin(tick * 0.1)) + noise + drift
-        
-        elif behavior == "stable":
-            # Just vibration, no drift
-            value = base_vibration + (5 * math.sin(tick * 0.2)) + noise
-            
-        elif behavior == "erratic":
-            # Random spikes every now and then
-            spike = 20 if random.random() > 0.95 else 0
-            value = base_vibration + noise + spike
+        # Refill the pre-generated buffer once every CHUNK_SIZE ticks
+        if tick == start_tick or tick % CHUNK_SIZE == 0:
+            chunk = generate_chunk(behavior, tick - tick % CHUNK_SIZE)
+        value = float(chunk[tick % CHUNK_SIZE])
 
-        # Payload
+        # Payload (timestamped here, since it is sent up to FLUSH_INTERVAL later)
         payload = {
             "sensor_id": sensor_id,
-            "value": round(value, 2)
+            "value": round(value, 2),
+            "timestamp": datetime.utcnow().isoformat()
         }
+        readings.append(payload)
+            
+        await asyncio.sleep(1) # 1Hz frequency
+        tick += 1
+
+async def flush_readings(client, readings):
+    """
+    POSTs everything buffered by the sensors as one batch every FLUSH_INTERVAL seconds.
+    """
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        if not readings:
+            continue
+        
+        # Single event loop: swapping the buffer out cannot race with the sensors
+        batch = readings[:]
+        readings.clear()
         
         try:
             # Send to API
-            requests.post(API_URL, json=payload)
+            # orjson encodes straight to bytes, skipping httpx's json.dumps
+            response = await client.post(API_URL, content=orjson.dumps(batch), headers=JSON_HEADERS, timeout=5)
+            response.raise_for_status()
         except Exception as e:
             # Simple error logging
-            print(f"[{sensor['name']}] Connection Error: {e}")
-            
-        time.sleep(1) # 1Hz frequency
-        tick += 1
+            print(f"[Fleet] Connection Error ({len(batch)} readings dropped): {e}")
 
-# Main Execution: Spin up threads
+async def backfill(client, seconds):
+    """
+    Replays `seconds` of 1Hz history for the whole fleet, ending now, through
+    the bulk-insert endpoint - e.g. to build up training data for the models.
+    """
+    print(f"Backfilling {seconds}s of history for {len(SENSOR_CONFIG)} sensors...")
+    codes = np.array([BEHAVIOR_CODES.get(s["behavior"], -1) for s in SENSOR_CONFIG])
+    values = replay_fleet(codes, seconds).round(2)
+    
+    end = np.datetime64(datetime.utcnow(), "ms")
+    timestamps = np.datetime_as_string(end - np.arange(seconds)[::-1].astype("timedelta64[s]"))
+    
+    dropped = 0
+    for sensor, sensor_values in zip(SENSOR_CONFIG, values):
+        for start in range(0, seconds, BACKFILL_BATCH_SIZE):
+            stop = start + BACKFILL_BATCH_SIZE
+            batch = [
+                {"sensor_id": sensor["id"], "value": value, "timestamp": timestamp}
+                for value, timestamp in zip(sensor_values[start:stop].tolist(), timestamps[start:stop].tolist())
+            ]
+            try:
+                # post() doesn't raise on 4xx/5xx, e.g. a 422 for an unknown sensor id
+                response = await client.post(API_URL, content=orjson.dumps(batch), headers=JSON_HEADERS, timeout=30)
+                response.raise_for_status()
+            except Exception as e:
+                dropped += len(batch)
+                print(f"[{sensor['name']}] Backfill Error ({len(batch)} readings dropped): {e}")
+    
+    if dropped:
+        print(f"Backfill finished with errors: {dropped} of {seconds * len(SENSOR_CONFIG)} readings dropped.")
+    else:
+        print("Backfill complete.")
+
+async def run_fleet():
+    """
+    One event loop drives every sensor, so the fleet scales without a thread per machine.
+    """
+    readings = []
+    limits = httpx.Limits(max_connections=200)
+    async with httpx.AsyncClient(http2=True, limits=limits) as client:
+        if BACKFILL_SECONDS > 0:
+            await backfill(client, BACKFILL_SECONDS)
+        await asyncio.gather(
+            flush_readings(client, readings),
+            # Live ticks pick up where the backfill ended, so drifting signals don't reset
+            *[simulate_sensor(sensor, readings, BACKFILL_SECONDS) for sensor in SENSOR_CONFIG],
+        )
+
+# Main Execution: Spin up the event loop
 if __name__ == "__main__":
     print("--- 🏭 STARTING FLEET SIMULATION ---")
     print(f"Targeting API: {API_URL}")
     print("Press Ctrl+C to stop all machines.")
     
-    threads = []
-    
-    for sensor in SENSOR_CONFIG:
-        # Create a thread for each machine
-        t = threading.Thread(target=simulate_sensor, args=(sensor,))
-        t.daemon = True # Kills thread when main program exits
-        t.start()
-        threads.append(t)
-    
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(run_fleet())
     except KeyboardInterrupt:
-        print("\nStopping Fleet...")
\ No newline at end of file
+        print("\nStopping Fleet...")
@@ -1,33 +1,41 @@
 import time
-import math
-import random
+import numpy as np
+from numba import njit
+import orjson
 import requests
 from datetime import datetime
 
 # CONFIGURATION
 API_URL = "http://localhost:8000/ingest"
 SENSOR_ID = "21e70f75-718f-476f-aa66-eb8ef52b22f3"
+CHUNK_SIZE = 1000  # Ticks synthesised per compiled call
+JSON_HEADERS = {"content-type": "application/json"}
 
-def generate_vibration_reading(tick):
+@njit(cache=True)
+def generate_vibration_chunk(t0, n=CHUNK_SIZE):
     """
-    Simulates a rotating machine (like a turbine).
+    Simulates a rotating machine (like a turbine) for n ticks starting at t0.
     - Base sine wave: The rotation.
     - Random noise: Sensor imperfection.
     - Drift: Slow increase to simulate wear/failure.
     """
-    base_vibration = 100  # Baseline Hz
-    
-    # 1. Physics: Sine wave representing rotation
-    rotation = 10 * math.sin(tick * 0.1)
-    
-    # 2. Reality: Random noise
-    noise = random.uniform(-2, 2)
-    
-    # 3. Failure Mode: Slow drift upwards over time (simulating a loose bearing)
-    # As 'tick' increases, the value creeps up.
-    wear_tear = tick * 0.05 
-    
-    return base_vibration + rotation + noise + wear_tear
+    out = np.empty(n)
+    for i in range(n):
+        tick = t0 + i
+        base_vibration = 100  # Baseline Hz
+        
+        # 1. Physics: Sine wave representing rotation
+        rotation = 10 * np.sin(tick * 0.1)
+        
+        # 2. Reality: Random noise
+        noise = np.random.uniform(-2, 2)
+        
+        # 3. Failure Mode: Slow drift upwards over time (simulating a loose bearing)
+        # As 'tick' increases, the value creeps up.
+        wear_tear = tick * 0.05 
+        
+        out[i] = base_vibration + rotation + noise + wear_tear
+    return out
 
 def simulate():
     print(f"--- Starting Simulation for Sensor {SENSOR_ID} ---")
@@ -36,8 +44,10 @@ def simulate():
     tick = 0
     try:
         while True:
-            # Generate physics-based data
-            value = generate_vibration_reading(tick)
+            # Generate physics-based data, CHUNK_SIZE ticks at a time
+            if tick % CHUNK_SIZE == 0:
+                chunk = generate_vibration_chunk(tick)
+            value = float(chunk[tick % CHUNK_SIZE])
             
             payload = {
                 "sensor_id": SENSOR_ID,
@@ -46,8 +56,8 @@ def simulate():
             
             # Send to our API
             try:
-                response = requests.post(API_URL, json=payload)
-                if response.status_code in [200, 201]:
+                response = requests.post(API_URL, data=orjson.dumps(payload), headers=JSON_HEADERS)
+                if response.status_code in [200, 201, 202]:
                     print(f"[{datetime.now().strftime('%H:%M:%S')}] Sent: {payload['value']} | Status: OK")
                 else:
                     print(f"Error: {response.text}")
@@ -0,0 +1,3 @@
+-- Publish telemetry inserts to Supabase Realtime so the dashboard can
+-- subscribe to postgres_changes instead of polling the table.
+alter publication supabase_realtime add table telemetry;
@@ -0,0 +1,24 @@
+-- Latest n readings for one sensor, returned oldest-first, so the dashboard
+-- receives ready-to-plot rows instead of sorting them client-side.
+-- Dropped first: create or replace can't change the returned columns of an
+-- earlier version of this function.
+drop function if exists recent_for_sensor(uuid, integer);
+create function recent_for_sensor(sid uuid, n integer default 100)
+returns table (
+    sensor_id uuid,
+    "timestamp" timestamptz,
+    value double precision
+)
+language sql
+stable
+as $$
+    select recent.sensor_id, recent."timestamp", recent.value
+    from (
+        select t.sensor_id, t."timestamp"::timestamptz as "timestamp", t.value::double precision as value
+        from telemetry t
+        where t.sensor_id = sid
+        order by t."timestamp" desc
+        limit n
+    ) as recent
+    order by recent."timestamp";
+$$;
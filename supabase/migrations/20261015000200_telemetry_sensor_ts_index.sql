@@ -0,0 +1,15 @@
+-- Covering index for the dashboard's hot query:
+--   where sensor_id = ? order by timestamp desc limit n
+-- INCLUDE (value) lets Postgres answer it with an index-only scan instead of
+-- a full scan + sort as the table grows.
+-- The Supabase CLI runs each migration in a transaction, which rules out
+-- CONCURRENTLY here, so this build blocks writes to telemetry while it runs.
+-- On a large live table, build it first without blocking ingestion:
+--   psql "$DATABASE_URL" -c 'create index concurrently if not exists telemetry_sensor_ts_desc on telemetry (sensor_id, "timestamp" desc) include (value);'
+-- and this migration then finds it already in place.
+create index if not exists telemetry_sensor_ts_desc
+    on telemetry (sensor_id, "timestamp" desc)
+    include (value);
+
+-- Refresh planner statistics so the new index is picked up immediately.
+analyze telemetry;